@@ -5,11 +5,12 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
-from typing import Union
+from typing import List, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
@@ -22,12 +23,12 @@ database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    _client = AsyncIOMotorClient(database_url)
     db = _client[database_name]
 
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp and a string `id` mirroring `_id`"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
 
@@ -37,13 +38,35 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
     else:
         data_dict = data.copy()
 
+    data_dict['_id'] = ObjectId()
+    data_dict['id'] = str(data_dict['_id'])
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
 
-    result = db[collection_name].insert_one(data_dict)
+    result = await db[collection_name].insert_one(data_dict)
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
+async def create_documents(collection_name: str, items: List[Union[BaseModel, dict]], ordered: bool = True):
+    """Insert many documents in one round trip, with the same id and timestamps as create_document"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    if not items:
+        return []
+
+    now = datetime.now(timezone.utc)
+    docs = []
+    for data in items:
+        data_dict = data.model_dump() if isinstance(data, BaseModel) else data.copy()
+        data_dict['_id'] = ObjectId()
+        data_dict['id'] = str(data_dict['_id'])
+        data_dict['created_at'] = now
+        data_dict['updated_at'] = now
+        docs.append(data_dict)
+
+    await db[collection_name].insert_many(docs, ordered=ordered)
+    return [d['id'] for d in docs]
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
     """Get documents from collection"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
@@ -52,4 +75,4 @@ def get_documents(collection_name: str, filter_dict: dict = None, limit: int = N
     if limit:
         cursor = cursor.limit(limit)
     
-    return list(cursor)
+    return await cursor.to_list(length=None)
@@ -1,14 +1,25 @@
+import asyncio
+import hashlib
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal, Tuple
 
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, Depends, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
-from jose import JWTError, jwt
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, EmailStr, Field
+import jwt
 from passlib.context import CryptContext
+from pymongo import ReturnDocument
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, PyMongoError
 
-from database import db, create_document
+from database import db, create_document, create_documents
 from schemas import (
     User as UserSchema,
     Athleteprofile as AthleteProfileSchema,
@@ -19,31 +30,153 @@ from schemas import (
     Moderation as ModerationSchema,
 )
 
+logger = logging.getLogger(__name__)
+
 # JWT settings
 SECRET_KEY = os.getenv("JWT_SECRET", "dev-secret-key-change")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
+# Built once and shared by every decode
+JWT_ALGORITHMS = (ALGORITHM,)
+JWT_DECODE_OPTIONS = {"require": ["exp", "sub"], "verify_aud": False}
+TOKEN_CACHE_TTL_SECONDS = 5
+
+# Decoded JWT payloads keyed by a digest of the raw token
+_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL_SECONDS)
+_token_cache_lock = threading.Lock()
+
+# Read-mostly documents fetched by id, keyed by (collection, id)
+DOC_CACHE_TTL_SECONDS = 30
+_doc_cache: TTLCache = TTLCache(maxsize=50_000, ttl=DOC_CACHE_TTL_SECONDS)
+
+# argon2 for new hashes; existing bcrypt hashes still verify
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    default="argon2",
+    deprecated="auto",
+    argon2__time_cost=2,
+    argon2__memory_cost=19456,
+    argon2__parallelism=1,
+    bcrypt__rounds=10,
+)
+
+# Roles allowed on restricted endpoints
+_CREATE_TEAM_ROLES = frozenset({"coach", "organizer", "admin"})
+_CREATE_EVENT_ROLES = frozenset({"organizer", "coach", "admin"})
+_ROSTER_EDIT_ROLES = frozenset({"coach", "admin"})
+_COACH_DASHBOARD_ROLES = frozenset({"coach", "admin"})
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Upper bound for page_size; a $facet page must fit in one 16 MB BSON document
+MAX_PAGE_SIZE = 100
 
-app = FastAPI(title="Sportex API", version="0.1.1")
+# Projections for list views; detail endpoints return full documents
+ATHLETE_LIST_FIELDS = {"_id": 0, "id": 1, "user_id": 1, "sport": 1, "position": 1, "stats": 1}
+EVENT_LIST_FIELDS = {
+    "_id": 0, "id": 1, "title": 1, "sport": 1, "location": 1, "starts_at": 1, "ends_at": 1,
+    "capacity": 1, "registered_count": 1, "organizer_user_id": 1,
+}
+REGISTRATION_LIST_FIELDS = {"_id": 0, "id": 1, "event_id": 1, "user_id": 1, "status": 1}
+
+app = FastAPI(title="Sportex API", version="0.1.1", default_response_class=ORJSONResponse)
+
+# Comma-separated allow-list; "*" is kept as the dev default. Credentials are only
+# allowed for explicit origins, since the spec forbids them alongside a wildcard.
+CORS_ORIGINS = tuple(o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip())
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=CORS_ORIGINS,
+    allow_credentials="*" not in CORS_ORIGINS,
+    allow_methods=("GET", "POST"),
+    allow_headers=("Authorization", "Content-Type"),
 )
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+
+# How long startup waits for the database before failing, and the pause between attempts
+DB_STARTUP_TIMEOUT_SECONDS = float(os.getenv("DB_STARTUP_TIMEOUT_SECONDS", "300"))
+DB_STARTUP_RETRY_SECONDS = 5
+
+# Collections whose documents are addressed by the string `id` create_document writes
+ID_COLLECTIONS = ("user", "athleteprofile", "team", "event", "registration", "notification", "moderation")
+
+# (collection, keys, options); compound keys lead with the most selective field
+INDEXES = [
+    *((c, "id", {"unique": True, "sparse": True}) for c in ID_COLLECTIONS),
+    ("user", "email", {"unique": True}),
+    ("athleteprofile", [("sport", 1), ("position", 1)], {}),
+    ("athleteprofile", "user_id", {}),
+    ("registration", [("event_id", 1), ("status", 1)], {}),
+    ("registration", [("event_id", 1), ("user_id", 1)], {"unique": True}),
+    ("notification", "user_id", {}),
+    ("team", "coach_user_id", {}),
+    ("event", "organizer_user_id", {}),
+    ("event", "sport", {}),
+]
+
+
+async def backfill_ids():
+    """Give documents written before create_document set `id` one derived from their `_id`"""
+    for collection in ID_COLLECTIONS:
+        await db[collection].update_many({"id": {"$exists": False}}, [{"$set": {"id": {"$toString": "$_id"}}}])
+
+
+async def backfill_registered_counts():
+    """Seed `registered_count` on events created before the counter existed"""
+    async for evt in db["event"].find({"registered_count": {"$exists": False}}, {"id": 1}):
+        event_id = evt.get("id") or str(evt["_id"])
+        count = await db["registration"].count_documents({"event_id": event_id, "status": {"$in": ["pending", "confirmed"]}})
+        await db["event"].update_one({"_id": evt["_id"], "registered_count": {"$exists": False}}, {"$set": {"registered_count": count}})
+
+
+async def migrate_and_index():
+    # Backfills must run before the unique `id` indexes are built and before any `{"id": x}` lookup.
+    # Every step is idempotent, so a run interrupted by a lost connection can simply be repeated.
+    await backfill_ids()
+    await backfill_registered_counts()
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except ConnectionFailure:
+            raise
+        except PyMongoError as exc:
+            if options.get("unique"):
+                # register and register_event rely on these to reject duplicates; refuse to serve without them
+                raise RuntimeError(
+                    f"Could not create unique index {keys} on {collection}; remove duplicate documents and restart"
+                ) from exc
+            logger.exception("Could not create index %s on %s", keys, collection)
+
+
+@app.on_event("startup")
+async def prepare_database():
+    """Migrate existing data and create indexes, waiting for the database; never boot half-migrated"""
+    if db is None:
+        return
+    deadline = time.monotonic() + DB_STARTUP_TIMEOUT_SECONDS
+    while True:
+        try:
+            await migrate_and_index()
+            return
+        except ConnectionFailure as exc:
+            if time.monotonic() >= deadline:
+                raise RuntimeError("Database unreachable; giving up on startup migrations") from exc
+            logger.warning("Database unreachable; retrying setup in %ss", DB_STARTUP_RETRY_SECONDS)
+            await asyncio.sleep(DB_STARTUP_RETRY_SECONDS)
+
+
+# Password hashing is CPU-bound; run it on its own pool so the event loop keeps serving
+_password_pool = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="password")
 
 
 # Utility helpers
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_password_pool, pwd_context.hash, password)
 
 
-def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
+async def verify_password(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """Check a password; also return a fresh hash when the stored one uses a deprecated scheme or cost"""
+    return await asyncio.get_running_loop().run_in_executor(_password_pool, pwd_context.verify_and_update, password, hashed)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -53,6 +186,66 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def decode_access_token(token: str) -> dict:
+    """Decode a JWT, reusing the payload of recently verified tokens until they expire"""
+    key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    now = time.time()
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    if cached is not None:
+        payload, expires_at = cached
+        if now < expires_at:
+            return payload
+    # Failed verifications raise here and are never cached
+    payload = jwt.decode(token, SECRET_KEY, algorithms=JWT_ALGORITHMS, options=JWT_DECODE_OPTIONS)
+    expires_at = min(float(payload["exp"]), now + TOKEN_CACHE_TTL_SECONDS)
+    with _token_cache_lock:
+        _token_cache[key] = (payload, expires_at)
+    return payload
+
+
+async def find_cached(collection: str, doc_id: str) -> Optional[dict]:
+    """Fetch a document by id through the short-lived document cache; misses are not cached"""
+    key = (collection, doc_id)
+    doc = _doc_cache.get(key)
+    if doc is None:
+        doc = await db[collection].find_one({"id": doc_id})
+        if doc is not None:
+            _doc_cache[key] = doc
+    return doc
+
+
+async def find_page(
+    collection: str,
+    q: Dict[str, Any],
+    projection: Dict[str, int],
+    skip: int,
+    limit: int,
+    stages: Optional[List[Dict[str, Any]]] = None,
+):
+    """Return one page of matches and the total count; `stages` run after the initial $match"""
+    # Unfiltered totals come from collection metadata; otherwise one $facet yields page and count.
+    # Pages are ordered by _id so skip/limit never repeat or drop rows between requests.
+    if not q and not stages:
+        docs = await db[collection].find({}, projection).sort("_id", 1).skip(skip).limit(limit).to_list(length=limit)
+        return docs, await db[collection].estimated_document_count()
+    pipeline = [
+        {"$match": q},
+        {"$sort": {"_id": 1}},
+        *(stages or []),
+        {"$facet": {
+            "results": [{"$skip": skip}, {"$limit": limit}, {"$project": projection}],
+            "total": [{"$count": "n"}],
+        }},
+    ]
+    out = (await db[collection].aggregate(pipeline).to_list(length=1))[0]
+    return out["results"], out["total"][0]["n"] if out["total"] else 0
+
+
+def invalidate_cached(collection: str, doc_id: Optional[str]) -> None:
+    _doc_cache.pop((collection, doc_id), None)
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
@@ -62,7 +255,7 @@ class RegisterPayload(BaseModel):
     email: EmailStr
     password: str
     name: str
-    role: str = "athlete"
+    role: Literal["athlete", "coach", "organizer", "admin", "guest"] = "athlete"
 
 
 class LoginPayload(BaseModel):
@@ -89,31 +282,28 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> dict:
         scheme, token = authorization.split()
         if scheme.lower() != "bearer":
             raise ValueError("Invalid scheme")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        user = db["user"].find_one({"id": user_id}) or db["user"].find_one({"_id": user_id})
+        payload = decode_access_token(token)
+        user = await db["user"].find_one({"id": payload["sub"]})
         if not user:
             email = payload.get("email")
             if email:
-                user = db["user"].find_one({"email": email})
+                user = await db["user"].find_one({"email": email})
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
         return user
-    except JWTError:
+    except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Token decode error")
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid authorization header")
 
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Sportex API running"}
 
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -126,7 +316,7 @@ def test_database():
         if db is not None:
             response["database"] = "✅ Connected & Working"
             response["connection_status"] = "Connected"
-            response["collections"] = db.list_collection_names()[:10]
+            response["collections"] = (await db.list_collection_names())[:10]
     except Exception as e:
         response["database"] = f"⚠️ Error: {str(e)[:80]}"
     return response
@@ -134,62 +324,69 @@ def test_database():
 
 # Auth endpoints
 @app.post("/auth/register", response_model=Token)
-def register(payload: RegisterPayload):
-    existing = db["user"].find_one({"email": payload.email})
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    user = UserSchema(
+async def register(payload: RegisterPayload):
+    # Payload fields were validated by FastAPI; skip a second pydantic pass
+    user_dict = UserSchema.model_construct(
         email=payload.email,
-        password_hash=hash_password(payload.password),
+        password_hash=await hash_password(payload.password),
         name=payload.name,
         role=payload.role,
-    )
-    user_dict = user.model_dump()
-    user_dict["id"] = create_document("user", user)
-    token = create_access_token({"sub": user_dict["id"], "email": user.email, "role": user.role})
+    ).model_dump()
+    try:
+        # The unique email index rejects duplicates atomically
+        user_dict["id"] = await create_document("user", user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    token = create_access_token({"sub": user_dict["id"], "email": user_dict["email"], "role": user_dict["role"]})
     return Token(access_token=token)
 
 
 @app.post("/auth/login", response_model=Token)
-def login(payload: LoginPayload):
-    user = db["user"].find_one({"email": payload.email})
-    if not user or not verify_password(payload.password, user.get("password_hash", "")):
+async def login(payload: LoginPayload):
+    user = await db["user"].find_one({"email": payload.email})
+    if not user:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+    valid, new_hash = await verify_password(payload.password, user.get("password_hash", ""))
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    if new_hash:
+        # Upgrade legacy bcrypt hashes to argon2 now that the plaintext is at hand
+        await db["user"].update_one({"_id": user["_id"]}, {"$set": {"password_hash": new_hash}})
     token = create_access_token({"sub": user.get("id") or str(user.get("_id")), "email": user["email"], "role": user.get("role", "athlete")})
     return Token(access_token=token)
 
 
 @app.get("/me")
-def me(current=Depends(get_current_user)):
+async def me(current=Depends(get_current_user)):
     safe = {k: v for k, v in current.items() if k not in ("password_hash",)}
     return safe
 
 
 # Athlete profiles
 @app.post("/athletes/me")
-def upsert_athlete_profile(data: ProfilePayload, current=Depends(get_current_user)):
+async def upsert_athlete_profile(data: ProfilePayload, current=Depends(get_current_user)):
     user_id = current.get("id") or str(current.get("_id"))
-    existing = db["athleteprofile"].find_one({"user_id": user_id})
-    payload = AthleteProfileSchema(user_id=user_id, **data.model_dump()).model_dump()
+    existing = await db["athleteprofile"].find_one({"user_id": user_id})
+    payload = {"user_id": user_id, **data.model_dump()}
     now = datetime.now(timezone.utc)
     payload.update({"updated_at": now})
     if existing:
-        db["athleteprofile"].update_one({"_id": existing["_id"]}, {"$set": payload})
-        doc = db["athleteprofile"].find_one({"_id": existing["_id"]})
-    else:
-        new_id = create_document("athleteprofile", payload)
-        doc = db["athleteprofile"].find_one({"id": new_id}) or {**payload, "id": new_id}
-    return doc
+        await db["athleteprofile"].update_one({"_id": existing["_id"]}, {"$set": payload})
+        invalidate_cached("athleteprofile", existing.get("id"))
+        # Same shape as the create path: no raw ObjectId `_id` in the response
+        return {**{k: v for k, v in existing.items() if k != "_id"}, **payload}
+    new_id = await create_document("athleteprofile", payload)
+    return {**payload, "id": new_id}
 
 
 @app.get("/athletes/{athlete_id}")
-def get_athlete(athlete_id: str, current=Depends(get_current_user)):
-    doc = db["athleteprofile"].find_one({"id": athlete_id}) or db["athleteprofile"].find_one({"_id": athlete_id})
+async def get_athlete(athlete_id: str, current=Depends(get_current_user)):
+    doc = await find_cached("athleteprofile", athlete_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Athlete not found")
     # Privacy: if private and not owner/admin, limit fields
     owner_id = doc.get("user_id")
-    owner = db["user"].find_one({"id": owner_id}) or {}
+    owner = await db["user"].find_one({"id": owner_id}) or {}
     privacy = owner.get("privacy", "public")
     if privacy == "private" and (current.get("id") != owner_id) and current.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Profile is private")
@@ -199,34 +396,36 @@ def get_athlete(athlete_id: str, current=Depends(get_current_user)):
 
 
 @app.get("/athletes")
-def list_athletes(
+async def list_athletes(
     sport: Optional[str] = None,
     position: Optional[str] = None,
     location: Optional[str] = None,
-    min_stat_key: Optional[str] = Query(None, description="e.g., ppg"),
+    min_stat_key: Optional[str] = Query(None, pattern=r"^\w+$", description="e.g., ppg"),
     min_stat_value: Optional[float] = Query(None),
-    page: int = 1,
-    page_size: int = 20,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
 ):
     q: Dict[str, Any] = {}
     if sport:
         q["sport"] = sport
     if position:
         q["position"] = position
-    if location:
-        # based on user location
-        user_ids = [u.get("id") or str(u.get("_id")) for u in db["user"].find({"location": location})]
-        q["user_id"] = {"$in": user_ids}
-    cursor = db["athleteprofile"].find(q)
     if min_stat_key is not None and min_stat_value is not None:
-        cursor = filter(lambda d: float(d.get("stats", {}).get(min_stat_key, -1)) >= float(min_stat_value), cursor)
-        docs = list(cursor)
-    else:
-        docs = list(cursor)
-    total = len(docs)
-    start = (page - 1) * page_size
-    end = start + page_size
-    return {"results": docs[start:end], "total": total, "page": page, "page_size": page_size}
+        # Compare as doubles so stats stored as numeric strings still match; non-numeric values don't
+        stat = {"$convert": {"input": f"$stats.{min_stat_key}", "to": "double", "onError": None, "onNull": None}}
+        q["$expr"] = {"$gte": [stat, min_stat_value]}
+    skip = (page - 1) * page_size
+    stages = None
+    if location:
+        # based on user location: join owners server-side after the profile $match.
+        # user_id holds the owner's stringified _id for every user, old or new, so join on _id.
+        stages = [
+            {"$addFields": {"_uid": {"$convert": {"input": "$user_id", "to": "objectId", "onError": None, "onNull": None}}}},
+            {"$lookup": {"from": "user", "localField": "_uid", "foreignField": "_id", "as": "_u"}},
+            {"$match": {"_u.location": location}},
+        ]
+    docs, total = await find_page("athleteprofile", q, ATHLETE_LIST_FIELDS, skip, page_size, stages)
+    return {"results": docs, "total": total, "page": page, "page_size": page_size}
 
 
 # Teams
@@ -237,37 +436,77 @@ class TeamCreate(BaseModel):
 
 
 @app.post("/teams")
-def create_team(payload: TeamCreate, current=Depends(get_current_user)):
-    if current.get("role") not in ("coach", "organizer", "admin"):
+async def create_team(payload: TeamCreate, current=Depends(get_current_user)):
+    if current.get("role") not in _CREATE_TEAM_ROLES:
         raise HTTPException(status_code=403, detail="Only coaches/organizers can create teams")
-    team = TeamSchema(name=payload.name, coach_user_id=current.get("id"), sport=payload.sport, location=payload.location)
-    team_id = create_document("team", team)
-    doc = db["team"].find_one({"id": team_id}) or {**team.model_dump(), "id": team_id}
-    return doc
+    team = TeamSchema.model_construct(name=payload.name, coach_user_id=current.get("id"), sport=payload.sport, location=payload.location)
+    team_id = await create_document("team", team)
+    return {**team.model_dump(), "id": team_id}
 
 
 @app.get("/teams/{team_id}")
-def get_team(team_id: str):
-    doc = db["team"].find_one({"id": team_id}) or db["team"].find_one({"_id": team_id})
+async def get_team(team_id: str):
+    doc = await find_cached("team", team_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Team not found")
     return doc
 
 
-@app.post("/teams/{team_id}/add")
-def add_to_roster(team_id: str, user_id: str, current=Depends(get_current_user)):
-    team = db["team"].find_one({"id": team_id})
+class RosterAddMany(BaseModel):
+    user_ids: List[str] = Field(min_length=1, max_length=100)
+
+
+async def get_team_for_roster_edit(team_id: str, current: dict) -> dict:
+    team = await db["team"].find_one({"id": team_id})
     if not team:
         raise HTTPException(status_code=404, detail="Team not found")
-    if current.get("role") not in ("coach", "admin") or team.get("coach_user_id") != current.get("id"):
+    if current.get("role") not in _ROSTER_EDIT_ROLES or team.get("coach_user_id") != current.get("id"):
         raise HTTPException(status_code=403, detail="Only coach can modify roster")
-    roster = team.get("roster_user_ids", [])
-    if user_id not in roster:
-        roster.append(user_id)
-        db["team"].update_one({"id": team_id}, {"$set": {"roster_user_ids": roster}})
-        notif = NotificationSchema(user_id=user_id, type="invite", title="Team Invite", body=f"You were added to {team['name']}")
-        create_document("notification", notif)
-    return {"ok": True, "roster": roster}
+    return team
+
+
+@app.post("/teams/{team_id}/add")
+async def add_to_roster(team_id: str, user_id: str, current=Depends(get_current_user)):
+    team = await get_team_for_roster_edit(team_id, current)
+    # $addToSet mutates the roster in place; no document back means user_id was already on it
+    updated = await db["team"].find_one_and_update(
+        {"id": team_id, "roster_user_ids": {"$ne": user_id}},
+        {"$addToSet": {"roster_user_ids": user_id}},
+        projection={"roster_user_ids": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not updated:
+        return {"ok": True, "roster": team.get("roster_user_ids", [])}
+    invalidate_cached("team", team_id)
+    notif = NotificationSchema.model_construct(user_id=user_id, type="invite", title="Team Invite", body=f"You were added to {team['name']}")
+    await create_document("notification", notif)
+    return {"ok": True, "roster": updated["roster_user_ids"]}
+
+
+@app.post("/teams/{team_id}/add_many")
+async def add_many_to_roster(team_id: str, payload: RosterAddMany, current=Depends(get_current_user)):
+    team = await get_team_for_roster_edit(team_id, current)
+    user_ids = list(dict.fromkeys(payload.user_ids))
+    # Diff against the roster as it was just before this update, so concurrent calls
+    # never both invite the same user
+    before = await db["team"].find_one_and_update(
+        {"id": team_id},
+        {"$addToSet": {"roster_user_ids": {"$each": user_ids}}},
+        projection={"roster_user_ids": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if not before:
+        raise HTTPException(status_code=404, detail="Team not found")
+    roster = before.get("roster_user_ids", [])
+    new_ids = [uid for uid in user_ids if uid not in roster]
+    if new_ids:
+        invalidate_cached("team", team_id)
+        notifs = [
+            NotificationSchema.model_construct(user_id=uid, type="invite", title="Team Invite", body=f"You were added to {team['name']}")
+            for uid in new_ids
+        ]
+        await create_documents("notification", notifs)
+    return {"ok": True, "roster": roster + new_ids}
 
 
 # Events
@@ -282,39 +521,27 @@ class EventCreate(BaseModel):
 
 
 @app.post("/events")
-def create_event(payload: EventCreate, current=Depends(get_current_user)):
-    if current.get("role") not in ("organizer", "coach", "admin"):
+async def create_event(payload: EventCreate, current=Depends(get_current_user)):
+    if current.get("role") not in _CREATE_EVENT_ROLES:
         raise HTTPException(status_code=403, detail="Only organizers/coaches can create events")
-    evt = EventSchema(
-        title=payload.title,
-        sport=payload.sport,
-        description=payload.description,
-        location=payload.location,
-        starts_at=payload.starts_at,
-        ends_at=payload.ends_at,
-        capacity=payload.capacity,
-        organizer_user_id=current.get("id"),
-    )
-    eid = create_document("event", evt)
-    doc = db["event"].find_one({"id": eid}) or {**evt.model_dump(), "id": eid}
-    return doc
+    evt = EventSchema.model_construct(**payload.model_dump(), organizer_user_id=current.get("id"))
+    eid = await create_document("event", evt)
+    return {**evt.model_dump(), "id": eid}
 
 
 @app.get("/events")
-def list_events(sport: Optional[str] = None, page: int = 1, page_size: int = 20):
+async def list_events(sport: Optional[str] = None, page: int = Query(1, ge=1), page_size: int = Query(20, ge=1, le=MAX_PAGE_SIZE)):
     q: Dict[str, Any] = {}
     if sport:
         q["sport"] = sport
-    docs = list(db["event"].find(q))
-    total = len(docs)
-    start = (page - 1) * page_size
-    end = start + page_size
-    return {"results": docs[start:end], "total": total, "page": page, "page_size": page_size}
+    skip = (page - 1) * page_size
+    docs, total = await find_page("event", q, EVENT_LIST_FIELDS, skip, page_size)
+    return {"results": docs, "total": total, "page": page, "page_size": page_size}
 
 
 @app.get("/events/{event_id}")
-def get_event(event_id: str):
-    doc = db["event"].find_one({"id": event_id}) or db["event"].find_one({"_id": event_id})
+async def get_event(event_id: str):
+    doc = await find_cached("event", event_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Event not found")
     return doc
@@ -322,88 +549,130 @@ def get_event(event_id: str):
 
 # Registration
 @app.post("/events/{event_id}/register")
-def register_event(event_id: str, current=Depends(get_current_user)):
-    evt = db["event"].find_one({"id": event_id})
-    if not evt:
-        raise HTTPException(status_code=404, detail="Event not found")
-    existing = db["registration"].find_one({"event_id": event_id, "user_id": current.get("id")})
+async def register_event(event_id: str, current=Depends(get_current_user)):
+    existing = await db["registration"].find_one({"event_id": event_id, "user_id": current.get("id")})
     if existing:
         return existing
-    count = db["registration"].count_documents({"event_id": event_id, "status": {"$in": ["pending", "confirmed"]}})
-    status = "confirmed" if count < int(evt.get("capacity", 100)) else "waitlisted"
-    reg = RegistrationSchema(event_id=event_id, user_id=current.get("id"), status=status)
-    rid = create_document("registration", reg)
-    notif = NotificationSchema(user_id=evt.get("organizer_user_id"), type="event_update", title="New Registration", body=f"New registration for {evt['title']}")
-    create_document("notification", notif)
-    return db["registration"].find_one({"id": rid}) or {**reg.model_dump(), "id": rid}
+    # Claim a seat atomically; no document back means the event is full or missing.
+    # Events still awaiting the registered_count backfill never hand out seats.
+    evt = await db["event"].find_one_and_update(
+        {"id": event_id, "registered_count": {"$exists": True}, "$expr": {"$lt": ["$registered_count", "$capacity"]}},
+        {"$inc": {"registered_count": 1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    status = "confirmed"
+    if evt:
+        invalidate_cached("event", event_id)
+    else:
+        evt = await db["event"].find_one({"id": event_id})
+        if not evt:
+            raise HTTPException(status_code=404, detail="Event not found")
+        status = "waitlisted"
+    reg = RegistrationSchema.model_construct(event_id=event_id, user_id=current.get("id"), status=status)
+    try:
+        rid = await create_document("registration", reg)
+    except DuplicateKeyError:
+        # A concurrent request registered this user first; give the seat back
+        if status == "confirmed":
+            await db["event"].update_one({"id": event_id}, {"$inc": {"registered_count": -1}})
+            invalidate_cached("event", event_id)
+        return await db["registration"].find_one({"event_id": event_id, "user_id": current.get("id")})
+    notif = NotificationSchema.model_construct(user_id=evt.get("organizer_user_id"), type="event_update", title="New Registration", body=f"New registration for {evt['title']}")
+    await create_document("notification", notif)
+    return {**reg.model_dump(), "id": rid}
 
 
 # Dashboards
 @app.get("/dashboard/coach")
-def coach_dashboard(current=Depends(get_current_user)):
-    if current.get("role") not in ("coach", "admin"):
+async def coach_dashboard(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    current=Depends(get_current_user),
+):
+    if current.get("role") not in _COACH_DASHBOARD_ROLES:
         raise HTTPException(status_code=403, detail="Only coaches")
-    teams = list(db["team"].find({"coach_user_id": current.get("id")}))
-    regs = list(db["registration"].find({}))
-    events = list(db["event"].find({"organizer_user_id": current.get("id")}))
+    teams = await db["team"].find({"coach_user_id": current.get("id")}, {"_id": 0}).to_list(length=None)
+    events = await db["event"].find({"organizer_user_id": current.get("id")}, EVENT_LIST_FIELDS).to_list(length=None)
+    # Only registrations for this coach's own events, one page at a time
+    event_ids = [e["id"] for e in events if "id" in e]
+    regs = (
+        await db["registration"]
+        .find({"event_id": {"$in": event_ids}}, REGISTRATION_LIST_FIELDS)
+        .sort("_id", 1)
+        .skip((page - 1) * page_size)
+        .limit(page_size)
+        .to_list(length=page_size)
+    )
     return {
         "teams": teams,
         "events": events,
         "registrations": regs,
+        "page": page,
+        "page_size": page_size,
     }
 
 
 # Notifications
 @app.get("/notifications")
-def my_notifications(current=Depends(get_current_user)):
-    notifs = list(db["notification"].find({"user_id": current.get("id")}))
+async def my_notifications(current=Depends(get_current_user)):
+    notifs = await db["notification"].find({"user_id": current.get("id")}).to_list(length=None)
     return {"results": notifs}
 
 
 @app.post("/notifications/{notif_id}/read")
-def mark_read(notif_id: str, current=Depends(get_current_user)):
-    db["notification"].update_one({"id": notif_id}, {"$set": {"read": True}})
+async def mark_read(notif_id: str, current=Depends(get_current_user)):
+    await db["notification"].update_one({"id": notif_id}, {"$set": {"read": True}})
     return {"ok": True}
 
 
 # Admin
 @app.get("/admin/overview")
-def admin_overview(current=Depends(get_current_user)):
+async def admin_overview(current=Depends(get_current_user)):
     if current.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Admins only")
     return {
-        "users": db["user"].count_documents({}),
-        "athletes": db["athleteprofile"].count_documents({}),
-        "teams": db["team"].count_documents({}),
-        "events": db["event"].count_documents({}),
-        "registrations": db["registration"].count_documents({}),
+        "users": await db["user"].count_documents({}),
+        "athletes": await db["athleteprofile"].count_documents({}),
+        "teams": await db["team"].count_documents({}),
+        "events": await db["event"].count_documents({}),
+        "registrations": await db["registration"].count_documents({}),
     }
 
 
 @app.post("/admin/moderate")
-def moderate(action: ModerationSchema, current=Depends(get_current_user)):
+async def moderate(action: ModerationSchema, current=Depends(get_current_user)):
     if current.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Admins only")
-    create_document("moderation", action)
+    await create_document("moderation", action)
     return {"ok": True}
 
 
 # Seed data endpoint
 @app.post("/seed")
-def seed():
-    if db["user"].count_documents({}) > 0:
+async def seed():
+    if await db["user"].count_documents({}) > 0:
         return {"message": "Already seeded"}
-    # Create admin, coach, organizer, and 10 athletes
-    admin_id = create_document("user", UserSchema(email="admin@sportex.io", password_hash=hash_password("admin123"), name="Admin", role="admin"))
-    coach_id = create_document("user", UserSchema(email="coach@sportex.io", password_hash=hash_password("coach123"), name="Coach Carla", role="coach", location="Austin, TX"))
-    org_id = create_document("user", UserSchema(email="org@sportex.io", password_hash=hash_password("org123"), name="Org Omar", role="organizer", location="Dallas, TX"))
+    # Hash the four distinct passwords concurrently on the password pool
+    admin_hash, coach_hash, org_hash, athlete_hash = await asyncio.gather(
+        hash_password("admin123"), hash_password("coach123"), hash_password("org123"), hash_password("pass1234")
+    )
 
-    # 10 athletes
+    # Create admin, coach, organizer, and 10 athletes in one insert
+    users = [
+        UserSchema(email="admin@sportex.io", password_hash=admin_hash, name="Admin", role="admin"),
+        UserSchema(email="coach@sportex.io", password_hash=coach_hash, name="Coach Carla", role="coach", location="Austin, TX"),
+        UserSchema(email="org@sportex.io", password_hash=org_hash, name="Org Omar", role="organizer", location="Dallas, TX"),
+    ]
+    users += [
+        UserSchema(email=f"athlete{i+1}@sportex.io", password_hash=athlete_hash, name=f"Athlete {i+1}", role="athlete", location="Austin, TX")
+        for i in range(10)
+    ]
+    admin_id, coach_id, org_id, *athletes = await create_documents("user", users, ordered=False)
+
+    # 10 athlete profiles
     sports = ["basketball", "soccer", "track", "volleyball"]
-    athletes = []
-    for i in range(10):
-        uid = create_document("user", UserSchema(email=f"athlete{i+1}@sportex.io", password_hash=hash_password("pass1234"), name=f"Athlete {i+1}", role="athlete", location="Austin, TX"))
-        prof = AthleteProfileSchema(
+    profiles = [
+        AthleteProfileSchema(
             user_id=uid,
             sport=sports[i % len(sports)],
             position=["G", "F", "M", "S"][i % 4],
@@ -413,24 +682,36 @@ def seed():
             media=[{"type": "image", "url": "https://placehold.co/600x400", "thumb": "https://placehold.co/300x200"}],
             recent_performance=[{"date": (datetime.now(timezone.utc) - timedelta(days=d)).date().isoformat(), "metric": "ppg", "value": round(6 + (i % 5) + d*0.2, 1)} for d in range(5)]
         )
-        create_document("athleteprofile", prof)
-        athletes.append(uid)
+        for i, uid in enumerate(athletes)
+    ]
+    await create_documents("athleteprofile", profiles, ordered=False)
 
-    # One team by coach
-    team_id = create_document("team", TeamSchema(name="Austin Hawks", coach_user_id=coach_id, sport="basketball", location="Austin, TX"))
+    # One team by coach, with the first 5 athletes on its roster
+    team_id = await create_document("team", TeamSchema(name="Austin Hawks", coach_user_id=coach_id, sport="basketball", location="Austin, TX", roster_user_ids=athletes[:5]))
 
-    # Two events by organizer
+    # Two events by organizer; the first 3 athletes are registered to the first
     now = datetime.now(timezone.utc)
-    e1 = create_document("event", EventSchema(title="Spring Showcase", sport="basketball", description="Open run for scouts", location="Austin, TX", starts_at=now + timedelta(days=7), ends_at=now + timedelta(days=7, hours=3), capacity=50, organizer_user_id=org_id))
-    e2 = create_document("event", EventSchema(title="Summer Combine", sport="soccer", description="Drills and scrimmages", location="Dallas, TX", starts_at=now + timedelta(days=21), ends_at=now + timedelta(days=21, hours=4), capacity=80, organizer_user_id=org_id))
-
-    # Add first 5 athletes to team and register first 3 to first event
-    roster = athletes[:5]
-    db["team"].update_one({"id": team_id}, {"$set": {"roster_user_ids": roster}})
-    for uid in athletes[:3]:
-        create_document("registration", RegistrationSchema(event_id=e1, user_id=uid, status="confirmed"))
+    registered = athletes[:3]
+    e1, e2 = await create_documents("event", [
+        EventSchema(title="Spring Showcase", sport="basketball", description="Open run for scouts", location="Austin, TX", starts_at=now + timedelta(days=7), ends_at=now + timedelta(days=7, hours=3), capacity=50, registered_count=len(registered), organizer_user_id=org_id),
+        EventSchema(title="Summer Combine", sport="soccer", description="Drills and scrimmages", location="Dallas, TX", starts_at=now + timedelta(days=21), ends_at=now + timedelta(days=21, hours=4), capacity=80, organizer_user_id=org_id),
+    ])
+    await create_documents("registration", [RegistrationSchema(event_id=e1, user_id=uid, status="confirmed") for uid in registered], ordered=False)
 
     return {"message": "Seeded", "admin_id": admin_id, "coach_id": coach_id, "organizer_id": org_id, "team_id": team_id, "event_ids": [e1, e2]}
 
 
 # OpenAPI will serve as our Postman collection
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+    )
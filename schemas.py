@@ -46,6 +46,7 @@ class Event(BaseModel):
     starts_at: datetime
     ends_at: datetime
     capacity: int = 100
+    registered_count: int = Field(0, description="Confirmed registrations, maintained atomically")
     organizer_user_id: str
 
 class Registration(BaseModel):